@@ -1,15 +1,40 @@
 #!/usr/bin/env python3
-from datetime import datetime, timedelta
-from itertools import groupby
-from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
 from ortools.linear_solver import pywraplp
 from typing import Any, Dict
+import argparse
 import json
-import math
+import numpy as np
 import sys
 
+try:
+    import orjson
+
+    def loads(stream):
+        return orjson.loads(stream.buffer.read())
+
+    def dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+except ImportError:
+    loads = json.load
+
+    def dumps(obj):
+        return json.dumps(obj, indent=2)
+
 
 BLOCKS = ("morning", "midday", "evening", "night")
+FEATURES = (
+    "offset",
+    "daily",
+    "seasonal_cos",
+    "seasonal_sin",
+    "solar_cos",
+    "solar_sin",
+    "weekly_cos",
+    "weekly_sin"
+)
+PERIODS = (365.25, 10.66 * 365.25, 7) # seasonal, solar and weekly cycles
 HOURS = {
     "morning": "09:00",
     "midday": "13:00",
@@ -25,118 +50,226 @@ STATUS = {
 
 
 def main() -> None:
-    input_data = json.load(sys.stdin)
-    output = solve(input_data)
-    print(json.dumps(output, indent=2))
+    parser = argparse.ArgumentParser(description="Solve forecasting model.")
+    parser.add_argument(
+        "-provider",
+        default="lstsq",
+        help="Fit with NumPy (lstsq) or an OR-Tools LP solver (e.g. GLOP).",
+        type=str,
+    )
+    args = parser.parse_args()
 
+    input_data = loads(sys.stdin)
+    try:
+        output = solve(input_data, args.provider)
+    except ValueError as e:
+        parser.error(str(e))
+    print(dumps(output))
 
-def solve(input_data: Dict[str, Any]) -> Dict[str, Any]:
-    provider = "SCIP"
-    solver = pywraplp.Solver.CreateSolver(provider)
 
-    big = 10**6 # solver.infinity() fails on arm64
+def solve(input_data: Dict[str, Any], provider: str = "lstsq") -> Dict[str, Any]:
+    start = datetime.now()
 
     demands = input_data["demands"]
     for i in demands:
         i["demand"] = int(i["demand"])
 
-    block_vars = {}
-    for block in BLOCKS:
-        block_vars[block] = {
-            "offset": solver.NumVar(-big, big, f"{block}[offset]"),
-            "daily": solver.NumVar(-big, big, f"{block}[daily]"),
-            "seasonal_cos": solver.NumVar(-big, big, f"{block}[seasonal_cos"),
-            "seasonal_sin": solver.NumVar(-big, big, f"{block}[seasonal_sin"),
-            "solar_cos": solver.NumVar(-big, big, f"{block}[solar_cos"),
-            "solar_sin": solver.NumVar(-big, big, f"{block}[solar_sin"),
-            "weekly_cos": solver.NumVar(-big, big, f"{block}[weekly_cos"),
-            "weekly_sin": solver.NumVar(-big, big, f"{block}[weekly_sin")
-        }
+    # Day indexes count calendar days from the first training date, so gaps in
+    # the data keep later days in phase.
+    dates = sorted({d["date"] for d in demands})
+    first = date.fromisoformat(dates[0]).toordinal()
+    day_of = {d: date.fromisoformat(d).toordinal() - first for d in dates}
+    n_days = day_of[dates[-1]] + 1
 
-    fittings = []
-    residuals = []
-    for i, (_, group) in enumerate(groupby(demands, itemgetter("date"))):
-        for g in group:
-            subscript = f"[{i}][{g['block']}]"
-            fitted = solver.NumVar(-big, big, f"fitted{subscript}")
-            residual = solver.NumVar(0, big, f"residual{subscript}")
-
-            fittings.append(fitted)
-            residuals.append(residual)
-
-            a = 2.0 * math.pi * i
-            x = block_vars[g["block"]]
-            solver.Add(
-                fitted
-                == x["offset"]
-                + (i * x["daily"])
-                + (math.cos(a / 365.25) * x["seasonal_cos"])
-                + (math.sin(a / 365.25) * x["seasonal_sin"])
-                + (math.cos(a / (10.66 * 365.25)) * x["solar_cos"])
-                + (math.sin(a / (10.66 * 365.25)) * x["solar_sin"])
-                + (math.cos(a / 7) * x["weekly_cos"])
-                + (math.sin(a / 7) * x["weekly_sin"])
-            )
+    # Regression features for every day index, including the forecast horizon.
+    features = design(n_days + 28)
 
-            solver.Add(residual >= g["demand"] - fitted)
-            solver.Add(residual >= fitted - g["demand"])
+    # Training set as arrays, split into (day index, features, demand) by block.
+    day_index = np.array([day_of[d["date"]] for d in demands], dtype=int)
+    blocks = np.array([d["block"] for d in demands])
+    demand = np.array([d["demand"] for d in demands], dtype=np.float64)
+    unknown = set(blocks.tolist()) - set(BLOCKS)
+    if unknown:
+        raise ValueError(f"unknown blocks: {', '.join(sorted(unknown))}")
 
-    solver.Minimize(sum(residuals))
-    status = solver.Solve()
+    rows = {block: np.flatnonzero(blocks == block) for block in BLOCKS}
+    data = {
+        block: (day_index[r], features[day_index[r]], demand[r])
+        for block, r in rows.items()
+    }
+
+    # Coefficients from a previous run, if given, seed the fit. They are
+    # relative to that run's first date, so re-phase them to ours.
+    hint = {}
+    if "hint" in input_data:
+        coefficients = input_data["hint"]["coefficients"]
+        unknown = set(coefficients) - set(BLOCKS)
+        if unknown:
+            raise ValueError(f"unknown hint blocks: {', '.join(sorted(unknown))}")
+        for block, values in coefficients.items():
+            missing = [f for f in FEATURES if f not in values]
+            if missing:
+                raise ValueError(
+                    f"hint for {block} is missing features: {', '.join(missing)}"
+                )
+
+        shift = first - date.fromisoformat(input_data["hint"]["date"]).toordinal()
+        hint = {
+            block: rephase(np.array([values[f] for f in FEATURES]), shift)
+            for block, values in coefficients.items()
+        }
+
+    if provider == "lstsq":
+        coefs, custom = fit_lstsq(data, hint)
+    else:
+        coefs, custom = fit_lp(provider, data, hint)
 
     # Add fitted data into training set.
-    for i, f in zip(demands, fittings):
-        i["forecast"] = f.solution_value()
-
-    # Forecast unknown demand.
-    forecast = []
-    date = datetime.strptime(demands[-1]["date"], "%Y-%m-%d")
-    for i in range(28):
-        j = (len(demands) / len(BLOCKS)) + i
-        for block in BLOCKS:
-            a = 2.0 * math.pi * j
-            x = block_vars[block]
-            y = (
-                x["offset"].solution_value()
-                + (j * x["daily"].solution_value())
-                + (math.cos(a / 365.25) * x["seasonal_cos"].solution_value())
-                + (math.sin(a / 365.25) * x["seasonal_sin"].solution_value())
-                + (math.cos(a / (10.66 * 365.25)) * x["solar_cos"].solution_value())
-                + (math.sin(a / (10.66 * 365.25)) * x["solar_sin"].solution_value())
-                + (math.cos(a / 7) * x["weekly_cos"].solution_value())
-                + (math.sin(a / 7) * x["weekly_sin"].solution_value())
-            )
+    fitted = np.empty(len(demands))
+    for block, r in rows.items():
+        fitted[r] = data[block][1] @ coefs[block]
+    value = float(np.abs(demand - fitted).sum())
+    for g, y in zip(demands, fitted.tolist()):
+        g["forecast"] = y
 
-            forecast.append(
+    # Forecast unknown demand, appending it after the training set.
+    horizon = {
+        block: (features[n_days:] @ coefs[block]).tolist() for block in BLOCKS
+    }
+    for j in range(28):
+        day = date.fromordinal(first + n_days + j).isoformat()
+        for block in BLOCKS:
+            demands.append(
                 {
-                    "when": f"{date.strftime('%Y-%m-%d')} {HOURS[block]}",
-                    "date": date.strftime("%Y-%m-%d"),
+                    "when": f"{day} {HOURS[block]}",
+                    "date": day,
                     "block": block,
-                    "forecast": y
+                    "forecast": horizon[block][j]
                 }
             )
-        date += timedelta(days=1)
+
+    duration = (datetime.now() - start).total_seconds()
 
     return {
-        "solutions": [demands + forecast],
+        "solutions": [demands],
         "statistics": {
             "result": {
                 "custom": {
-                    "constraints": solver.NumConstraints(),
-                    "provider": provider,
-                    "status": STATUS.get(status, "unknown"),
-                    "variables": solver.NumVariables()
+                    "hint": {
+                        "date": dates[0],
+                        "coefficients": {
+                            block: dict(zip(FEATURES, coefs[block].tolist()))
+                            for block in BLOCKS
+                        }
+                    },
+                    **custom
                 },
-                "duration": solver.WallTime() / 1000,
-                "value": solver.Objective().Value()
+                "duration": duration,
+                "value": value
             },
             "run": {
-                "duration": solver.WallTime() / 1000
+                "duration": duration
             },
             "schema": "v1"
         }
     }
 
 
+# Regression features, one row per day index and one column per FEATURES entry.
+def design(n: int) -> np.ndarray:
+    i = np.arange(n, dtype=np.float64)
+    a = 2.0 * np.pi * i
+    columns = [np.ones(n), i]
+    for period in PERIODS:
+        columns += [np.cos(a / period), np.sin(a / period)]
+    return np.column_stack(columns)
+
+
+# Re-expresses coefficients so day index 0 moves forward by k days.
+def rephase(beta, k):
+    offset, daily = beta[:2]
+    shifted = [offset + daily * k, daily]
+    for period, c, s in zip(PERIODS, beta[2::2], beta[3::2]):
+        a = 2.0 * np.pi * k / period
+        shifted += [c * np.cos(a) + s * np.sin(a), s * np.cos(a) - c * np.sin(a)]
+    return np.array(shifted)
+
+
+# Approximates the LAD fit with iteratively reweighted least squares.
+def fit_lstsq(data, hint, iterations=5, eps=1e-6):
+    coefs = {}
+    for block, (_, x, y) in data.items():
+        if block in hint:
+            beta = hint[block]
+        else:
+            beta, *_ = np.linalg.lstsq(x, y, rcond=None)
+        for _ in range(iterations):
+            w = 1.0 / np.sqrt(np.maximum(np.abs(y - x @ beta), eps))
+            beta, *_ = np.linalg.lstsq(x * w[:, None], y * w, rcond=None)
+
+        coefs[block] = beta
+
+    custom = {
+        "constraints": 0,
+        "provider": "lstsq",
+        "status": "optimal",
+        "variables": len(BLOCKS) * len(FEATURES)
+    }
+    return coefs, custom
+
+
+# Blocks share no variables or constraints, so solve their LPs in parallel.
+def fit_lp(provider, data, hint):
+    # Fail here rather than inside a worker process.
+    if not pywraplp.Solver.CreateSolver(provider):
+        raise ValueError(f"unsupported provider: {provider}")
+
+    with ProcessPoolExecutor(max_workers=len(BLOCKS)) as executor:
+        futures = {
+            block: executor.submit(
+                fit_block, provider, block, *data[block], hint.get(block)
+            )
+            for block in BLOCKS
+        }
+        results = {block: future.result() for block, future in futures.items()}
+
+    statuses = [status for _, status, _, _ in results.values()]
+    coefs = {block: beta for block, (beta, _, _, _) in results.items()}
+    custom = {
+        "constraints": sum(n for _, _, n, _ in results.values()),
+        "provider": provider,
+        "status": next((s for s in statuses if s != "optimal"), "optimal"),
+        "variables": sum(n for _, _, _, n in results.values())
+    }
+    return coefs, custom
+
+
+def fit_block(provider, block, index, x, y, hint=None):
+    solver = pywraplp.Solver.CreateSolver(provider)
+
+    big = 10**6 # solver.infinity() fails on arm64
+
+    coefs = [solver.NumVar(-big, big, f"{block}[{f}]") for f in FEATURES]
+    residuals = [solver.NumVar(0, big, f"residual[{i}][{block}]") for i in index]
+
+    for terms, demand, residual in zip(x.tolist(), y.tolist(), residuals):
+        fitted = solver.Sum([c * v for c, v in zip(terms, coefs)])
+        solver.Add(residual >= demand - fitted)
+        solver.Add(residual >= fitted - demand)
+
+    if hint is not None: # used by SCIP, ignored by GLOP
+        solver.SetHint(coefs, hint.tolist())
+
+    solver.Minimize(solver.Sum(residuals))
+    status = solver.Solve()
+
+    return (
+        np.array([v.solution_value() for v in coefs]),
+        STATUS.get(status, "unknown"),
+        solver.NumConstraints(),
+        solver.NumVariables()
+    )
+
+
 if __name__ == "__main__":
     main()
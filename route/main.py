@@ -8,9 +8,23 @@ from ortools.constraint_solver import pywrapcp, routing_enums_pb2
 from typing import Any, Dict
 import argparse
 import json
-import math
+import numpy as np
 import sys
 
+try:
+    import orjson
+
+    def loads(stream):
+        return orjson.loads(stream.buffer.read())
+
+    def dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+except ImportError:
+    loads = json.load
+
+    def dumps(obj):
+        return json.dumps(obj, indent=2)
+
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="Solve routing model.")
@@ -22,9 +36,9 @@ def main() -> None:
     )
     args = parser.parse_args()
 
-    input_data = json.load(sys.stdin)
+    input_data = loads(sys.stdin)
     output = solve(input_data, args.duration)
-    print(json.dumps(output, indent=2))
+    print(dumps(output))
 
 
 def solve(input_data: Dict[str, Any], duration: int) -> Dict[str, Any]:
@@ -39,25 +53,16 @@ def solve(input_data: Dict[str, Any], duration: int) -> Dict[str, Any]:
     )
     routing = pywrapcp.RoutingModel(manager)
 
-    # Create and register a transit callback.
-    def distance_callback(from_index, to_index):
-        from_node = manager.IndexToNode(from_index)
-        to_node = manager.IndexToNode(to_index)
-        return distance_matrix[from_node][to_node]
-
-    transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+    # Register the distance matrix directly so arc costs are looked up in C++
+    # without calling back into Python during search.
+    transit_callback_index = routing.RegisterTransitMatrix(distance_matrix)
 
     # Define cost of each arc.
     routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
 
     # Add Capacity constraint.
-    def demand_callback(from_index):
-        from_node = manager.IndexToNode(from_index)
-        if from_node == depot:
-            return 0
-        return -input_data["stops"][from_node-1]["quantity"]
-
-    demand_callback_index = routing.RegisterUnaryTransitCallback(demand_callback)
+    demands = [0] + [-s["quantity"] for s in input_data["stops"]]
+    demand_callback_index = routing.RegisterUnaryTransitVector(demands)
 
     capacity = input_data["defaults"]["vehicles"]["capacity"]
     routing.AddDimensionWithVehicleCapacity(
@@ -161,26 +166,22 @@ def matrix(input_data):
     for s in input_data["stops"]:
         locations.append(s["location"])
 
-    m = []
-    for start in locations:
-        row = []
-        for end in locations:
-            km = haversine(start["lon"], start["lat"], end["lon"], end["lat"])
-            row.append(round(km, 2))
-        m.append(row)
-    return m
+    lat = np.array([loc["lat"] for loc in locations])
+    lon = np.array([loc["lon"] for loc in locations])
+    return haversine(lon[:, None], lat[:, None], lon[None, :], lat[None, :])
 
 
+# Broadcasts over arrays, so matrix() computes all pairs in one pass.
 def haversine(lon1, lat1, lon2, lat2):
-    lon1, lat1, lon2, lat2 = map(math.radians, [lon1, lat1, lon2, lat2])
+    lon1, lat1, lon2, lat2 = map(np.radians, [lon1, lat1, lon2, lat2])
 
     dlon = lon2 - lon1
     dlat = lat2 - lat1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
+    a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+    c = 2 * np.arcsin(np.sqrt(a))
     r = 6371
 
-    return int(round(c * r))
+    return np.round(c * r).astype(int).tolist()
 
 
 if __name__ == "__main__":
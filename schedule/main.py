@@ -1,11 +1,27 @@
 #!/usr/bin/env python3
-from datetime import timedelta
-from dateutil.parser import parse
+from datetime import datetime, timedelta
+from heapq import heappop, heappush
+from operator import itemgetter
 from ortools.linear_solver import pywraplp
 from typing import Any, Dict
 import json
+import math
 import sys
 
+try:
+    import orjson
+
+    def loads(stream):
+        return orjson.loads(stream.buffer.read())
+
+    def dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+except ImportError:
+    loads = json.load
+
+    def dumps(obj):
+        return json.dumps(obj, indent=2)
+
 
 STATUS = {
     pywraplp.Solver.FEASIBLE: "suboptimal",
@@ -16,22 +32,33 @@ STATUS = {
 
 
 def main() -> None:
-    input_data = json.load(sys.stdin)
+    input_data = loads(sys.stdin)
     output = solve(input_data)
-    print(json.dumps(output, indent=2))
+    print(dumps(output))
 
 
 def solve(input_data: Dict[str, Any]) -> Dict[str, Any]:
     provider = "SCIP"
     solver = pywraplp.Solver.CreateSolver(provider)
 
+    # The model is small, so skip SCIP's presolve and cutting plane rounds.
+    solver.SetSolverSpecificParametersAsString(
+        "presolving/maxrounds = 0\n"
+        "separating/maxrounds = 0\n"
+        "separating/maxroundsroot = 0\n"
+    )
+
     # shifts[w] = 1 if worker w's shift is assigned
     shifts = []
     for worker in input_data["workers"]:
+        start = worker["availability"][0]["start"]
+        end = worker["availability"][0]["end"]
         shifts.append({
             "worker_id": worker["id"],
-            "start": worker["availability"][0]["start"],
-            "end": worker["availability"][0]["end"],
+            "start": start,
+            "end": end,
+            "start_time": int(parse(start).timestamp()),
+            "end_time": int(parse(end).timestamp()),
             "var": solver.BoolVar(name=f"shifts[{worker['id']}]")
         })
 
@@ -39,37 +66,50 @@ def solve(input_data: Dict[str, Any]) -> Dict[str, Any]:
     supply = []
     ub = len(shifts)
     for req in input_data["required_workers"]:
-        t = parse(req["start"])
+        start = parse(req["start"])
         end = parse(req["end"])
 
-        while t < end:
-            hour = str(t).replace(' ', 'T')
+        # Hours in [start, end), offset from a single parsed start.
+        start_time = int(start.timestamp())
+        hours = math.ceil((end - start) / timedelta(hours=1))
+        for k in range(hours):
+            hour = (start + timedelta(hours=k)).isoformat()
             supply.append({
                 "hour": hour,
-                "demand": req["count"],
-                "var": solver.NumVar(lb=0, ub=ub, name=f"supply[{hour}]")
+                "time": start_time + 3600 * k,
+                "demand": req["count"]
             })
-            t += timedelta(hours=1)
 
-    # supply = sum of matching, selected shifts.
-    for s in supply:
-        x = [t["var"] for t in shifts if t["start"] <= s["hour"] <= t["end"]]
-        solver.Add(s["var"] == sum(x))
+    # supply = sum of matching, selected shifts. Sweep hours in time order,
+    # activating shifts as they start and retiring them once they end.
+    pending = sorted(
+        range(len(shifts)), key=lambda w: shifts[w]["start_time"], reverse=True
+    )
+    active = [] # heap of (end_time, w) for shifts that have started
+    for s in sorted(supply, key=itemgetter("time")):
+        while pending and shifts[pending[-1]]["start_time"] <= s["time"]:
+            w = pending.pop()
+            heappush(active, (shifts[w]["end_time"], w))
+        while active and active[0][0] < s["time"]:
+            heappop(active)
+
+        s["shifts"] = [shifts[w]["var"] for _, w in active]
+        s["expr"] = solver.Sum(s["shifts"])
 
     # Objective = sum of oversupply and undersupply penalties.
     obj = []
     for s in supply:
         over = solver.NumVar(lb=0, ub=ub, name=f"over[{s['hour']}")
         under = solver.NumVar(lb=0, ub=ub, name=f"under[{s['hour']}")
-        solver.Add(over >= s["var"] - s["demand"])
-        solver.Add(under >= s["demand"] - s["var"])
+        solver.Add(over >= s["expr"] - s["demand"])
+        solver.Add(under >= s["demand"] - s["expr"])
         obj.extend((
             input_data["penalties"]["oversupply"] * over,
             input_data["penalties"]["undersupply"] * under
         ))
 
     # Minimize sum of penalties.
-    solver.Minimize(sum(obj))
+    solver.Minimize(solver.Sum(obj))
     status = solver.Solve()
 
     # Pull out shift assignments from solution.
@@ -89,7 +129,10 @@ def solve(input_data: Dict[str, Any]) -> Dict[str, Any]:
                 "number_assigned_workers": len(assigned_shifts),
                 "demand": [s["demand"] for s in supply],
                 "hour": [s["hour"] for s in supply],
-                "supply": [int(s["var"].solution_value()) for s in supply]
+                "supply": [
+                    round(sum(x.solution_value() for x in s["shifts"]))
+                    for s in supply
+                ]
             }
         ],
         "statistics": {
@@ -111,5 +154,12 @@ def solve(input_data: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
+# fromisoformat only accepts a trailing Z from Python 3.11.
+def parse(timestamp: str) -> datetime:
+    if timestamp.endswith("Z"):
+        timestamp = timestamp[:-1] + "+00:00"
+    return datetime.fromisoformat(timestamp)
+
+
 if __name__ == "__main__":
     main()